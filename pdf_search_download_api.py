@@ -1,20 +1,66 @@
 import os
+import re
+import logging
 import requests
+import httpx
+from requests.adapters import HTTPAdapter
+import urllib3
+from urllib3.util.retry import Retry
 from tqdm import tqdm
-import json
-from urllib.parse import quote
+import orjson
+import hashlib
 import time
+from urllib.parse import quote, urlparse
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 from datetime import datetime
 from dotenv import load_dotenv
 
+# Content types accepted as PDF responses
+PDF_CONTENT_TYPES = ('application/pdf', 'application/x-pdf', 'application/octet-stream')
+
+# Characters removed from queries used in filenames (anything but letters, digits, space, '-' and '_')
+UNSAFE_FILENAME_CHARS = re.compile(r'[^\w -]+')
+
+# (connect, read) timeout in seconds for every HTTP request
+REQUEST_TIMEOUT = (5, 15)
+
+# Retries (with exponential back-off) for transient HTTP errors and rate limiting
+MAX_RETRIES = 3
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# Longest wait in seconds before a retry, whatever Retry-After asks for
+RETRY_MAX_WAIT = 5
+
+# Response headers recorded in the download log
+LOGGED_HEADERS = ('content-type', 'content-length', 'server', 'last-modified')
+
+logger = logging.getLogger(__name__)
+
+class CappedRetry(Retry):
+    """
+    urllib3 Retry that honours Retry-After for at most RETRY_MAX_WAIT seconds,
+    so a single response cannot stall a download worker past the batch timeout.
+    """
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, RETRY_MAX_WAIT)
+
 class GoogleCustomSearchPDFDownloader:
-    def __init__(self, api_key=None, cx_id=None):
+    def __init__(self, api_key=None, cx_id=None, cache_dir=".search_cache", cache_expire_after=3600):
         """
         Initialize the downloader with Google Custom Search credentials.
         
         Args:
             api_key (str, optional): Google Custom Search API key
             cx_id (str, optional): Custom Search Engine ID
+            cache_dir (str, optional): Directory for cached search result pages,
+                or None to disable caching
+            cache_expire_after (int): Seconds before a cached search page expires
         """
         # Load environment variables
         load_dotenv()
@@ -27,7 +73,128 @@ class GoogleCustomSearchPDFDownloader:
             raise ValueError("API key and CX ID are required. Please set them in .env file or provide them directly.")
             
         self.base_url = "https://www.googleapis.com/customsearch/v1"
+        self.cache_dir = cache_dir
+        self.cache_expire_after = cache_expire_after
+        
+        user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        
+        # HTTP/2 client for the search API, so all result pages are multiplexed
+        # over a single connection to googleapis.com
+        self.search_client = httpx.Client(
+            transport=httpx.HTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+                retries=MAX_RETRIES,
+            ),
+            headers={'User-Agent': user_agent, 'Accept': 'application/json'},
+            timeout=httpx.Timeout(REQUEST_TIMEOUT[1], connect=REQUEST_TIMEOUT[0]),
+        )
+        
+        # Reuse one session for downloads so connections (and TLS handshakes) are kept alive
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': user_agent,
+            'Accept': 'application/pdf,application/x-pdf,application/octet-stream',
+            'Accept-Language': 'en-US,en;q=0.9',
+        })
+        retries = CappedRetry(
+            total=MAX_RETRIES,
+            backoff_factor=RETRY_BACKOFF_FACTOR,
+            status_forcelist=RETRY_STATUS_CODES,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        # Keep enough pooled connections per host that concurrent workers never
+        # discard them (and have to reconnect and re-resolve the host)
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64, pool_block=False, max_retries=retries)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        # Limit concurrent downloads from any single host
+        self.max_downloads_per_host = 2
+        self._host_semaphores = {}
+        self._host_lock = threading.Lock()
         
+        # Free progress bar rows, one per download worker
+        self._bar_positions = queue.Queue()
+        
+        # Downloads in the current batch keyed by a digest of the start of the PDF,
+        # each with an event set once it finishes and whether it succeeded
+        self._content_digests = {}
+        self._digest_lock = threading.Lock()
+        
+    def close(self):
+        """
+        Close the underlying HTTP clients and release pooled connections.
+        """
+        self.search_client.close()
+        self.session.close()
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        
+    def _cache_path(self, params):
+        """
+        Get the cache file path for a set of search parameters.
+        
+        Args:
+            params (dict): Search request parameters
+        
+        Returns:
+            str: Path of the cache file for these parameters
+        """
+        # Leave the API key out of the cache key so it never ends up on disk
+        cache_params = {k: v for k, v in params.items() if k != 'key'}
+        cache_key = hashlib.sha1(orjson.dumps(cache_params, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        return os.path.join(self.cache_dir, f"{cache_key}.json")
+        
+    def _load_cached_page(self, params):
+        """
+        Load a cached search result page if one exists and has not expired.
+        
+        Args:
+            params (dict): Search request parameters
+        
+        Returns:
+            dict: Cached search results, or None on a cache miss
+        """
+        if not self.cache_dir:
+            return None
+            
+        path = self._cache_path(params)
+        try:
+            if time.time() - os.path.getmtime(path) > self.cache_expire_after:
+                return None
+            with open(path, 'rb') as f:
+                return orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return None
+            
+    def _save_cached_page(self, params, content):
+        """
+        Store a search result page in the on-disk cache.
+        
+        Args:
+            params (dict): Search request parameters
+            content (bytes): Raw JSON body of the search response
+        """
+        if not self.cache_dir:
+            return
+            
+        path = self._cache_path(params)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write to a temporary file first so readers never see a partial page
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(content)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Warning: Could not cache search results: {str(e)}")
+            
     def save_links_to_file(self, urls, query):
         """
         Save PDF links to a text file with timestamp.
@@ -41,7 +208,7 @@ class GoogleCustomSearchPDFDownloader:
         filename = f"pdf_links_{timestamp}.txt"
         
         # Create a safe query for the filename
-        safe_query = "".join(c for c in query if c.isalnum() or c in (' ', '-', '_')).rstrip()
+        safe_query = UNSAFE_FILENAME_CHARS.sub('', query).rstrip()
         if safe_query:
             filename = f"pdf_links_{safe_query}_{timestamp}.txt"
         
@@ -56,10 +223,85 @@ class GoogleCustomSearchPDFDownloader:
         
         print(f"\nPDF links saved to: {filename}")
         
+    @staticmethod
+    def _retry_delay(response, attempt):
+        """
+        Get how long to wait before retrying a failed search request.
+        
+        Args:
+            response (httpx.Response): Response that failed
+            attempt (int): Number of the attempt that failed (0-based)
+        
+        Returns:
+            float: Seconds to wait, from Retry-After or exponential back-off,
+                capped at RETRY_MAX_WAIT
+        """
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            delay = RETRY_BACKOFF_FACTOR * (2 ** attempt)
+        return min(delay, RETRY_MAX_WAIT)
+        
+    def _fetch_search_page(self, base_params, start_index):
+        """
+        Fetch a single page of Google Custom Search results.
+        
+        Args:
+            base_params (dict): Search parameters shared by every page
+            start_index (int): Index of the first result on the page (1-based)
+        
+        Returns:
+            dict: Parsed search results, or None if the request failed
+        """
+        params = {**base_params, 'start': start_index}
+        
+        cached_results = self._load_cached_page(params)
+        if cached_results is not None:
+            return cached_results
+        
+        try:
+            for attempt in range(MAX_RETRIES + 1):
+                response = self.search_client.get(self.base_url, params=params)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == MAX_RETRIES:
+                    break
+                time.sleep(self._retry_delay(response, attempt))
+            
+            # Add more detailed error handling
+            if response.status_code == 400:
+                print("Error: Bad Request - Please check your API key and CX ID")
+                return None
+            elif response.status_code == 403:
+                print("Error: Authentication failed - Please verify your API key")
+                return None
+            elif response.status_code == 429:
+                # Already backed off and retried; the quota is exhausted
+                retry_after = response.headers.get('Retry-After')
+                wait_hint = f" (retry after {retry_after}s)" if retry_after else ""
+                print(f"Error: API rate limit exceeded - Please try again later{wait_hint}")
+                return None
+            elif response.status_code != 200:
+                print(f"Error: API request failed with status code {response.status_code}")
+                return None
+                
+            response.raise_for_status()
+            search_results = orjson.loads(response.content)
+            self._save_cached_page(params, response.content)
+            return search_results
+            
+        except httpx.HTTPError as e:
+            print(f"Error during API request: {str(e)}")
+        except orjson.JSONDecodeError as e:
+            print(f"Error parsing API response: {str(e)}")
+            
+        return None
+        
     def search_pdfs(self, query, num_results=10):
         """
         Search for PDFs using Google Custom Search API.
         
+        All result pages are requested concurrently over the HTTP/2 search client.
+        
         Args:
             query (str): Search query
             num_results (int): Number of results to retrieve (max 100)
@@ -75,57 +317,59 @@ class GoogleCustomSearchPDFDownloader:
         # Clean and encode the query
         query = query.strip()
         
+        # Prepare the search parameters shared by every page
+        base_params = {
+            'key': self.api_key,
+            'cx': self.cx_id,
+            'q': query,
+            'fileType': 'pdf',
+            'alt': 'json'
+        }
+        
+        fetch_page = partial(self._fetch_search_page, base_params)
+        
         pdf_urls = []
+        seen_urls = set()
         num_requests = min(10, (num_results + 9) // 10)
+        if num_requests < 1:
+            return pdf_urls
         
-        for i in range(num_requests):
-            start_index = i * 10 + 1
-            
-            # Prepare search parameters
-            params = {
-                'key': self.api_key,
-                'cx': self.cx_id,
-                'q': f"{query} filetype:pdf",
-                'start': start_index,
-                'fileType': 'pdf',
-                'alt': 'json'
-            }
+        # Fetch the first page on its own to learn how many pages actually exist
+        first_page = fetch_page(1)
+        pages = [first_page]
+        
+        if first_page and 'items' in first_page and first_page.get('queries', {}).get('nextPage'):
+            total_results = int(first_page.get('searchInformation', {}).get('totalResults', 0))
+            num_requests = min(num_requests, (total_results + 9) // 10)
+            start_indices = [i * 10 + 1 for i in range(1, num_requests)]
             
-            try:
-                response = requests.get(self.base_url, params=params)
+            if start_indices:
+                with ThreadPoolExecutor(max_workers=len(start_indices)) as executor:
+                    pages.extend(executor.map(fetch_page, start_indices))
+        
+        for search_results in pages:
+            # Stop at the first failed page, as results after it would be out of order
+            if search_results is None or 'items' not in search_results:
+                break
                 
-                # Add more detailed error handling
-                if response.status_code == 400:
-                    print("Error: Bad Request - Please check your API key and CX ID")
-                    break
-                elif response.status_code == 403:
-                    print("Error: Authentication failed - Please verify your API key")
-                    break
-                elif response.status_code != 200:
-                    print(f"Error: API request failed with status code {response.status_code}")
-                    break
+            for item in search_results['items']:
+                # fileType=pdf already restricts results to PDFs, including ones
+                # served from URLs without a .pdf suffix; downloads verify the content
+                if 'link' in item:
+                    # The same PDF often shows up on several result pages
+                    normalized_url = item['link'].split('#')[0].rstrip('/').lower()
+                    if normalized_url in seen_urls:
+                        continue
+                    seen_urls.add(normalized_url)
+                    pdf_urls.append(item['link'])
                     
-                response.raise_for_status()
-                search_results = response.json()
-                
-                if 'items' in search_results:
-                    for item in search_results['items']:
-                        if 'link' in item and item['link'].lower().endswith('.pdf'):
-                            pdf_urls.append(item['link'])
-                            if len(pdf_urls) >= num_results:
-                                # Save links to file before returning
-                                self.save_links_to_file(pdf_urls, query)
-                                return pdf_urls[:num_results]
-                                
-            except requests.exceptions.RequestException as e:
-                print(f"Error during API request: {str(e)}")
-                break
-            except json.JSONDecodeError as e:
-                print(f"Error parsing API response: {str(e)}")
+            if len(pdf_urls) >= num_results:
+                pdf_urls = pdf_urls[:num_results]
                 break
                 
-            # Respect API rate limits
-            time.sleep(1)
+            # No further pages exist after this one
+            if not search_results.get('queries', {}).get('nextPage'):
+                break
             
         # Save links to file if we have any results
         if pdf_urls:
@@ -133,13 +377,272 @@ class GoogleCustomSearchPDFDownloader:
             
         return pdf_urls
     
-    def download_pdfs(self, urls, output_dir="downloaded_pdfs"):
+    def _get_host_semaphore(self, url):
+        """
+        Get the semaphore limiting concurrent downloads from the host of a URL.
+        
+        Args:
+            url (str): URL being downloaded
+        
+        Returns:
+            threading.Semaphore: Semaphore shared by all downloads from that host
+        """
+        host = urlparse(url).netloc.lower()
+        with self._host_lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = threading.Semaphore(self.max_downloads_per_host)
+            return self._host_semaphores[host]
+    
+    def _claim_content(self, digest, deadline=None):
+        """
+        Claim the download of a PDF's content, first waiting for any download of
+        the same content that is already in progress.
+        
+        Args:
+            digest (str): Digest of the start of the PDF
+            deadline (float, optional): time.monotonic() value after which to
+                stop waiting
+        
+        Returns:
+            str: 'claimed' if this download should go ahead (and must then call
+                _release_content), 'duplicate' if the content was already
+                downloaded, or 'timeout' if the deadline passed while waiting
+        """
+        while True:
+            with self._digest_lock:
+                entry = self._content_digests.get(digest)
+                if entry is None:
+                    self._content_digests[digest] = {'done': threading.Event(), 'success': False}
+                    return 'claimed'
+                    
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            if not entry['done'].wait(timeout):
+                return 'timeout'
+            if entry['success']:
+                return 'duplicate'
+            # The other download failed and gave up its claim, so try again
+    
+    def _release_content(self, digest, success):
+        """
+        Release a claim taken with _claim_content and wake up waiting duplicates.
+        
+        Args:
+            digest (str): Digest of the start of the PDF
+            success (bool): Whether the PDF was downloaded and verified
+        """
+        with self._digest_lock:
+            entry = self._content_digests[digest]
+            entry['success'] = success
+            # A failed download must not make other copies of the PDF be skipped
+            if not success:
+                del self._content_digests[digest]
+        entry['done'].set()
+    
+    def _is_pdf(self, url):
+        """
+        Check whether a URL serves a PDF without downloading its body.
+        
+        Sends a HEAD request and decides on its Content-Type alone, so a .pdf
+        link serving an HTML landing page is caught too. If the server rejects
+        HEAD, falls back to a ranged GET of the first kilobyte and looks for
+        the PDF signature.
+        
+        Args:
+            url (str): URL to check
+        
+        Returns:
+            bool: False if the URL clearly does not serve a PDF, True otherwise
+        """
+        try:
+            response = self.session.head(url, allow_redirects=True, timeout=REQUEST_TIMEOUT)
+            
+            if response.status_code in (403, 405):
+                headers = {'Range': 'bytes=0-1023', 'Accept-Encoding': 'identity'}
+                with self.session.get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+                    if response.status_code not in (200, 206):
+                        return True
+                    return b'%PDF-' in response.raw.read(1024, decode_content=True)
+                    
+            # Let the full download report other status codes
+            if response.status_code != 200:
+                return True
+                
+            content_type = response.headers.get('content-type', '').lower()
+            if not content_type:
+                return True
+            return any(pdf_type in content_type for pdf_type in PDF_CONTENT_TYPES)
+            
+        except requests.exceptions.RequestException:
+            # Inconclusive, so leave the decision to the full download
+            return True
+    
+    def _download_one(self, url, index, output_dir, deadline=None):
+        """
+        Download a single PDF. Safe to call from worker threads.
+        
+        Args:
+            url (str): PDF URL to download
+            index (int): Position of the URL in the batch, used for the filename
+            output_dir (str): Directory to save the downloaded PDF
+            deadline (float, optional): time.monotonic() value after which the
+                download is abandoned
+        
+        Returns:
+            dict: Download result with the url, index, filename, status code,
+                response headers, success flag and a message
+        """
+        filename = os.path.join(output_dir, f"document_{index}.pdf")
+        result = {
+            'index': index,
+            'url': url,
+            'filename': filename,
+            'status_code': None,
+            'headers': None,
+            'success': False,
+            'message': '',
+        }
+        
+        # Draw the progress bar in a row owned by this download until it finishes;
+        # outside download_pdfs no rows are handed out, so let tqdm pick one
+        try:
+            position = self._bar_positions.get_nowait()
+        except queue.Empty:
+            position = None
+        file_created = False
+        claimed_digest = None
+        try:
+            with self._get_host_semaphore(url):
+                if deadline is not None and time.monotonic() > deadline:
+                    result['message'] = f"Skipped: {url} - Overall download timeout reached"
+                    return result
+                    
+                if not self._is_pdf(url):
+                    result['message'] = f"Failed to download: {url} - URL does not serve a PDF"
+                    return result
+                    
+                # The check (with its retries) can itself take a while
+                if deadline is not None and time.monotonic() > deadline:
+                    result['message'] = f"Skipped: {url} - Overall download timeout reached"
+                    return result
+                    
+                # PDFs are already compressed, so ask for the bytes as stored
+                headers = {'Accept-Encoding': 'identity'}
+                with self.session.get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+                    result['status_code'] = response.status_code
+                    result['headers'] = {k: response.headers.get(k) for k in LOGGED_HEADERS}
+                    logger.debug("Response headers for %s: %s", url, response.headers)
+                    
+                    if response.status_code != 200:
+                        result['message'] = f"Failed to download: {url} - HTTP Status Code: {response.status_code}"
+                        return result
+                    
+                    content_type = response.headers.get('content-type', '').lower()
+                    content_length = response.headers.get('content-length', 0)
+                    
+                    # Check if the content type indicates a PDF
+                    is_pdf = any(pdf_type in content_type for pdf_type in PDF_CONTENT_TYPES)
+                    
+                    total_size = int(content_length) if content_length else 0
+                    timed_out = False
+                    
+                    # Read the head and the rest of the body from one stream; mixing
+                    # raw.read() and raw.stream() breaks chunked transfer encoding
+                    chunks = response.raw.stream(65536, decode_content=True)
+                    head = b''
+                    for data in chunks:
+                        head += data
+                        if len(head) >= 8192:
+                            break
+                    
+                    # Otherwise trust the PDF signature, not a .pdf suffix on the URL,
+                    # which is often just a link to an HTML landing page
+                    if not (is_pdf or b'%PDF-' in head[:1024]):
+                        result['message'] = f"Failed to download: {url} - Content type is not PDF: {content_type}"
+                        return result
+                    
+                    # Skip PDFs downloaded from another URL, comparing the first 8 KiB
+                    # before fetching the rest of the body
+                    if head:
+                        digest = hashlib.sha256(head[:8192]).hexdigest()
+                        claim = self._claim_content(digest, deadline)
+                        if claim == 'duplicate':
+                            result['message'] = f"Skipped: {url} - Same content as an earlier download"
+                            return result
+                        if claim == 'timeout':
+                            result['message'] = f"Skipped: {url} - Overall download timeout reached"
+                            return result
+                        claimed_digest = digest
+                    
+                    file_created = True
+                    with open(filename, 'wb', buffering=1024 * 1024) as pdf_file, tqdm(
+                        desc=os.path.basename(filename),
+                        total=total_size,
+                        unit='iB',
+                        unit_scale=True,
+                        unit_divisor=1024,
+                        position=position,
+                        leave=False,
+                    ) as pbar:
+                        pbar.update(pdf_file.write(head))
+                        
+                        # Read 64 KiB at a time straight from urllib3: large enough to keep
+                        # Python-level iterations low, small enough that the deadline is
+                        # checked often on slow servers (each read waits for a full chunk)
+                        for data in chunks:
+                            if deadline is not None and time.monotonic() > deadline:
+                                timed_out = True
+                                break
+                            pbar.update(pdf_file.write(data))
+                        
+                        # The PDF is rarely read back right away, so let the kernel
+                        # drop its pages from the page cache (not available on Windows).
+                        # Only pages already written back are dropped; syncing first
+                        # would stall the worker on the disk, so the rest are left be.
+                        if not timed_out and hasattr(os, 'posix_fadvise'):
+                            pdf_file.flush()
+                            try:
+                                os.posix_fadvise(pdf_file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+                            except OSError:
+                                # Only a cache hint; the file itself is complete
+                                pass
+            
+            # Verify the downloaded file is a PDF
+            if timed_out:
+                result['message'] = f"Error downloading {url}: Overall download timeout reached"
+            elif os.path.getsize(filename) > 0:
+                result['success'] = True
+                result['message'] = f"Successfully downloaded to: {filename}"
+            else:
+                result['message'] = "Error: Downloaded file is empty"
+                
+        # The body is read from the raw urllib3 stream, so errors in the middle
+        # of it arrive as urllib3 exceptions rather than requests ones
+        except (requests.exceptions.Timeout, urllib3.exceptions.ReadTimeoutError):
+            result['message'] = f"Error downloading {url}: Request timed out"
+        except (requests.exceptions.ConnectionError, urllib3.exceptions.HTTPError):
+            result['message'] = f"Error downloading {url}: Connection error"
+        except Exception as e:
+            result['message'] = f"Error downloading {url}: {str(e)}"
+        finally:
+            # Never leave a partial or empty PDF behind
+            if file_created and not result['success'] and os.path.exists(filename):
+                os.remove(filename)
+            if claimed_digest:
+                self._release_content(claimed_digest, result['success'])
+            if position is not None:
+                self._bar_positions.put(position)
+            
+        return result
+    
+    def download_pdfs(self, urls, output_dir="downloaded_pdfs", max_workers=8, overall_timeout=600):
         """
-        Download PDFs from the provided URLs.
+        Download PDFs from the provided URLs concurrently.
         
         Args:
             urls (list): List of PDF URLs to download
             output_dir (str): Directory to save downloaded PDFs
+            max_workers (int): Maximum number of concurrent downloads
+            overall_timeout (float): Seconds after which remaining downloads are abandoned
         """
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
@@ -153,113 +656,70 @@ class GoogleCustomSearchPDFDownloader:
             f.write(f"Total URLs to download: {len(urls)}\n")
             f.write("-" * 50 + "\n\n")
             
-            for i, url in enumerate(urls, 1):
-                try:
-                    filename = os.path.join(output_dir, f"document_{i}.pdf")
-                    
-                    print(f"\nDownloading: {url}")
-                    f.write(f"\nAttempting to download {i}: {url}\n")
-                    
-                    # Add headers to mimic a browser request
-                    headers = {
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                        'Accept': 'application/pdf,application/x-pdf,application/octet-stream',
-                        'Accept-Language': 'en-US,en;q=0.9',
-                        'Connection': 'keep-alive',
-                    }
-                    
-                    response = requests.get(url, stream=True, headers=headers, timeout=30)
+            deadline = time.monotonic() + overall_timeout
+            with self._digest_lock:
+                self._content_digests.clear()
+            
+            self._bar_positions = queue.Queue()
+            for position in range(max_workers):
+                self._bar_positions.put(position)
+            
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(self._download_one, url, i, output_dir, deadline)
+                    for i, url in enumerate(urls, 1)
+                ]
+                
+                # Only this thread writes to the log file
+                for future in as_completed(futures):
+                    result = future.result()
                     
-                    # Log response details for debugging
-                    f.write(f"Response Status Code: {response.status_code}\n")
-                    f.write(f"Response Headers: {dict(response.headers)}\n")
+                    log_lines = [f"\nAttempting to download {result['index']}: {result['url']}\n"]
+                    if result['status_code'] is not None:
+                        # Log response details for debugging
+                        log_lines.append(f"Response Status Code: {result['status_code']}\n")
+                        log_lines.append(f"Response Headers: {result['headers']}\n")
+                    log_lines.append(f"{result['message']}\n")
+                    f.write("".join(log_lines))
                     
-                    if response.status_code == 200:
-                        content_type = response.headers.get('content-type', '').lower()
-                        content_length = response.headers.get('content-length', 0)
-                        
-                        # Check if the content type indicates a PDF
-                        is_pdf = any(pdf_type in content_type for pdf_type in ['application/pdf', 'application/x-pdf', 'application/octet-stream'])
-                        
-                        if is_pdf or url.lower().endswith('.pdf'):
-                            total_size = int(content_length) if content_length else 0
-                            
-                            with open(filename, 'wb') as pdf_file, tqdm(
-                                desc=os.path.basename(filename),
-                                total=total_size,
-                                unit='iB',
-                                unit_scale=True,
-                                unit_divisor=1024,
-                            ) as pbar:
-                                for data in response.iter_content(chunk_size=1024):
-                                    size = pdf_file.write(data)
-                                    pbar.update(size)
-                            
-                            # Verify the downloaded file is a PDF
-                            if os.path.getsize(filename) > 0:
-                                print(f"Successfully downloaded: {filename}")
-                                f.write(f"Successfully downloaded to: {filename}\n")
-                            else:
-                                print(f"Error: Downloaded file is empty")
-                                f.write(f"Error: Downloaded file is empty\n")
-                                os.remove(filename)
-                        else:
-                            print(f"Skipping {url} - Content type is not PDF: {content_type}")
-                            f.write(f"Failed to download: {url} - Content type is not PDF: {content_type}\n")
-                    else:
-                        print(f"Skipping {url} - HTTP Status Code: {response.status_code}")
-                        f.write(f"Failed to download: {url} - HTTP Status Code: {response.status_code}\n")
-                        
-                except requests.exceptions.Timeout:
-                    print(f"Error downloading {url}: Request timed out")
-                    f.write(f"Error downloading {url}: Request timed out\n")
-                except requests.exceptions.ConnectionError:
-                    print(f"Error downloading {url}: Connection error")
-                    f.write(f"Error downloading {url}: Connection error\n")
-                except Exception as e:
-                    print(f"Error downloading {url}: {str(e)}")
-                    f.write(f"Error downloading {url}: {str(e)}\n")
-                
-                # Add a small delay between downloads
-                time.sleep(1)
+                    tqdm.write(result['message'])
         
         print(f"\nDownload log saved to: {download_log}")
 
 def main():
     try:
         # Initialize downloader with credentials from .env file
-        downloader = GoogleCustomSearchPDFDownloader()
-        
-        # Get search parameters
-        query = input("Enter your search query: ").strip()
-        if not query:
-            print("Error: Search query cannot be empty")
-            return
+        with GoogleCustomSearchPDFDownloader() as downloader:
+            # Get search parameters
+            query = input("Enter your search query: ").strip()
+            if not query:
+                print("Error: Search query cannot be empty")
+                return
+                
+            num_results = input("Enter number of results to retrieve (default 10, max 100): ")
             
-        num_results = input("Enter number of results to retrieve (default 10, max 100): ")
-        
-        try:
-            num_results = min(int(num_results), 100)
-        except (ValueError, TypeError):
-            num_results = 10
-        
-        # Perform search
-        print(f"\nSearching for: {query}")
-        pdf_urls = downloader.search_pdfs(query, num_results)
-        
-        if not pdf_urls:
-            print("No PDF results found.")
-            return
+            try:
+                num_results = min(int(num_results), 100)
+            except (ValueError, TypeError):
+                num_results = 10
             
-        print(f"\nFound {len(pdf_urls)} PDF results.")
-        
-        # Ask user if they want to download the PDFs
-        download_choice = input("\nDo you want to download these PDFs? (yes/no): ").strip().lower()
-        if download_choice == 'yes':
-            # Download PDFs
-            downloader.download_pdfs(pdf_urls)
-        else:
-            print("\nPDF links have been saved to a text file. You can download them later.")
+            # Perform search
+            print(f"\nSearching for: {query}")
+            pdf_urls = downloader.search_pdfs(query, num_results)
+            
+            if not pdf_urls:
+                print("No PDF results found.")
+                return
+                
+            print(f"\nFound {len(pdf_urls)} PDF results.")
+            
+            # Ask user if they want to download the PDFs
+            download_choice = input("\nDo you want to download these PDFs? (yes/no): ").strip().lower()
+            if download_choice == 'yes':
+                # Download PDFs
+                downloader.download_pdfs(pdf_urls)
+            else:
+                print("\nPDF links have been saved to a text file. You can download them later.")
             
     except ValueError as e:
         print(f"Error: {str(e)}")